@@ -1,9 +1,21 @@
+"""
+Splits every Markdown file in CHUNKER_INPUT_FOLDER into logical sections with
+Gemini, reviews and enriches each one, and writes the chunks as JSON.
+
+Install dependencies:
+  pip install google-genai "httpx[http2]" pydantic python-dotenv
+"""
+
+import asyncio
 import hashlib
 import json
 import os
 from pathlib import Path
+from typing import Optional
 from dotenv import load_dotenv
-from google import genai
+from google.genai import types
+from pydantic import BaseModel, TypeAdapter
+from gemini_client import RateLimiter, call_gemini, create_client
 
 load_dotenv()
 
@@ -25,11 +37,39 @@ GEMINI_API_KEY = _require("GEMINI_API_KEY")
 INPUT_FOLDER   = _require("CHUNKER_INPUT_FOLDER")
 OUTPUT_FOLDER  = _require("CHUNKER_OUTPUT_FOLDER")
 
-client = genai.Client(api_key=GEMINI_API_KEY)
+# Max number of Gemini calls in flight at once, shared by every document
+# being processed (keep under the Gemini RPM quota)
+GEMINI_CONCURRENCY = int(os.environ.get("CHUNKER_GEMINI_CONCURRENCY", "8"))
+
+# generate_content requests allowed per minute
+GEMINI_RPM = int(os.environ.get("CHUNKER_GEMINI_RPM", "60"))
+
+client = create_client(GEMINI_API_KEY)
+
+# Shared by every split and review call, across all documents
+gemini_limiter = RateLimiter(GEMINI_RPM)
+
+# ── Response schemas ──────────────────────────────────────────────────────────
+# Gemini is asked for JSON matching these, so replies parse directly instead of
+# being scraped out of free text.
+
+class Section(BaseModel):
+    title: str
+    content: str
+
+
+class ChunkReview(BaseModel):
+    self_contained: bool
+    missing_context: Optional[str]
+    summary: str
+    enriched_text: str
+
+
+SECTIONS = TypeAdapter(list[Section])
 
 # ── Step 1: LLM splits the document into logical sections ─────────────────────
 
-def split_document_with_llm(text: str, filename: str) -> list[dict]:
+async def split_document_with_llm(text: str, filename: str) -> list[dict]:
     """
     Send the full document to Gemini and ask it to identify logical sections.
     Returns a list of { title, content } dicts.
@@ -66,22 +106,26 @@ Example format:
 
 Return only raw JSON, no markdown fences, no explanation."""
 
-    response = client.models.generate_content(
-        model="gemini-3.1-flash-lite-preview",
-        contents=prompt
+    response = await call_gemini(
+        lambda: client.aio.models.generate_content(
+            model="gemini-3.1-flash-lite-preview",
+            contents=prompt,
+            config=types.GenerateContentConfig(
+                response_mime_type="application/json",
+                response_schema=list[Section]
+            )
+        ),
+        gemini_limiter
     )
 
-    raw = response.text.strip()
-    raw = raw.replace("```json", "").replace("```", "").strip()
-
-    sections = json.loads(raw)
-    print(f"    LLM identified {len(sections)} sections")
+    sections = [s.model_dump() for s in SECTIONS.validate_json(response.text)]
+    print(f"    [{filename}] LLM identified {len(sections)} sections")
     return sections
 
 
 # ── Step 2: LLM reviews each chunk and enriches if needed ─────────────────────
 
-def review_chunk(title: str, body: str, prev_body: str = None) -> dict:
+async def review_chunk(title: str, body: str, prev_body: str = None) -> dict:
     """
     Ask Gemini to review a chunk and enrich it if it lacks context.
     """
@@ -112,33 +156,52 @@ Answer ONLY with a valid JSON object with these exact fields:
 
 Return only raw JSON, no markdown fences, no explanation."""
 
-    response = client.models.generate_content(
-        model="gemini-3.1-flash-lite-preview",
-        contents=prompt
+    response = await call_gemini(
+        lambda: client.aio.models.generate_content(
+            model="gemini-3.1-flash-lite-preview",
+            contents=prompt,
+            config=types.GenerateContentConfig(
+                response_mime_type="application/json",
+                response_schema=ChunkReview
+            )
+        ),
+        gemini_limiter
     )
 
-    raw = response.text.strip()
-    raw = raw.replace("```json", "").replace("```", "").strip()
-
-    return json.loads(raw)
+    return ChunkReview.model_validate_json(response.text).model_dump()
 
 
 # ── Full document pipeline ─────────────────────────────────────────────────────
 
-def process_document(filepath: str, doc_type: str = "manual") -> list[dict]:
+async def process_document(
+    filepath: str,
+    doc_type: str = "manual",
+    semaphore: asyncio.Semaphore = None
+) -> list[dict]:
     with open(filepath, 'r', encoding='utf-8') as f:
         content = f.read()
 
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(GEMINI_CONCURRENCY)
+
     filename = os.path.basename(filepath)
-    print(f"  Splitting document with LLM...")
-    sections = split_document_with_llm(content, filename)
+    print(f"  [{filename}] Splitting document with LLM...")
+    async with semaphore:
+        sections = await split_document_with_llm(content, filename)
 
     if not sections:
         print(f"  ⚠️  No sections returned for {filename}")
         return []
 
-    final_chunks = []
+    # Reviews are independent of each other (prev_body comes from the split
+    # output, not from a previous review), so run them concurrently.
+    async def review_section(i: int, title: str, body: str) -> dict:
+        prev_body = sections[i - 1].get("content", "") if i > 0 else None
+        async with semaphore:
+            print(f"    [{filename}] Reviewing chunk {i+1}/{len(sections)}: '{title[:60]}'...")
+            return await review_chunk(title, body, prev_body)
 
+    pending = []
     for i, section in enumerate(sections):
         title = section.get("title", f"Section {i+1}")
         body  = section.get("content", "")
@@ -146,14 +209,18 @@ def process_document(filepath: str, doc_type: str = "manual") -> list[dict]:
         if not body.strip():
             continue
 
-        print(f"    Reviewing chunk {i+1}/{len(sections)}: '{title[:60]}'...")
+        pending.append((i, title, body))
 
-        prev_body = sections[i - 1].get("content", "") if i > 0 else None
+    reviews = await asyncio.gather(
+        *(review_section(i, title, body) for i, title, body in pending),
+        return_exceptions=True
+    )
 
-        try:
-            review = review_chunk(title, body, prev_body)
-        except (json.JSONDecodeError, Exception) as e:
-            print(f"    ⚠️  LLM review error on chunk {i+1}, keeping raw. Error: {e}")
+    final_chunks = []
+
+    for (i, title, body), review in zip(pending, reviews):
+        if isinstance(review, Exception):
+            print(f"    ⚠️  [{filename}] LLM review error on chunk {i+1}, keeping raw. Error: {review}")
             review = {
                 "self_contained":  True,
                 "missing_context": None,
@@ -189,7 +256,7 @@ def get_doc_type(filename: str) -> str:
 
 # ── Main ──────────────────────────────────────────────────────────────────────
 
-if __name__ == "__main__":
+async def main():
     input_path  = Path(INPUT_FOLDER)
     output_path = Path(OUTPUT_FOLDER)
     output_path.mkdir(parents=True, exist_ok=True)
@@ -199,21 +266,42 @@ if __name__ == "__main__":
     if not md_files:
         print("⚠️  No .md files found in the input folder.")
         print(f"    Make sure your files are in: {INPUT_FOLDER}")
-        exit()
+        return
 
-    all_chunks = []
+    # Documents are independent, so process them all at once. The shared
+    # semaphore caps the total number of Gemini calls across documents, and
+    # all file writes happen here, one at a time, as documents finish.
+    semaphore = asyncio.Semaphore(GEMINI_CONCURRENCY)
 
-    for md_file in md_files:
+    async def run(md_file: Path) -> tuple[Path, Optional[list[dict]]]:
         print(f"\n📄 Processing: {md_file.name}")
         doc_type = get_doc_type(md_file.name)
-        chunks   = process_document(str(md_file), doc_type=doc_type)
-        all_chunks.extend(chunks)
+        # One failed document must not take down the ones still in flight
+        try:
+            chunks = await process_document(str(md_file), doc_type=doc_type, semaphore=semaphore)
+        except Exception as e:
+            print(f"  ❌ [{md_file.name}] Failed, skipping. Error: {e}")
+            return md_file, None
+        return md_file, chunks
+
+    chunks_by_file = {}
+    failed_files   = []
+
+    for next_done in asyncio.as_completed([run(f) for f in md_files]):
+        md_file, chunks = await next_done
+        if chunks is None:
+            failed_files.append(md_file)
+            continue
+        chunks_by_file[md_file] = chunks
 
         per_file_output = output_path / f"{md_file.stem}_chunks.json"
         with open(per_file_output, 'w', encoding='utf-8') as f:
             json.dump(chunks, f, indent=2, ensure_ascii=False)
         print(f"  ✅ {len(chunks)} chunks → {per_file_output.name}")
 
+    # Keep the combined output in input order regardless of completion order
+    all_chunks = [c for md_file in md_files for c in chunks_by_file.get(md_file, [])]
+
     combined_output = output_path / "all_chunks.json"
     with open(combined_output, 'w', encoding='utf-8') as f:
         json.dump(all_chunks, f, indent=2, ensure_ascii=False)
@@ -222,7 +310,16 @@ if __name__ == "__main__":
     enriched = sum(1 for c in all_chunks if not c["self_contained"])
     print(f"\n{'─'*50}")
     print(f"✅ All done!")
-    print(f"   Files processed : {len(md_files)}")
+    print(f"   Files processed : {len(chunks_by_file)}")
+    print(f"   Files failed    : {len(failed_files)}")
     print(f"   Total chunks    : {total}")
     print(f"   Enriched chunks : {enriched} ({round(enriched/total*100) if total else 0}% needed context)")
     print(f"   Output folder   : {OUTPUT_FOLDER}")
+
+    if failed_files:
+        names = ", ".join(sorted(f.name for f in failed_files))
+        raise SystemExit(f"ERROR: {len(failed_files)} file(s) failed to process: {names}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,16 +1,28 @@
 """
-One-time script: reads all_chunks.json, generates embeddings with Gemini,
+One-time script: streams all_chunks.json, generates embeddings with Gemini,
 and inserts everything into Postgres.
 
 Install dependencies:
-  pip install google-genai psycopg2-binary python-dotenv
+  pip install google-genai "httpx[http2]" psycopg2-binary pgvector numpy ijson python-dotenv
 """
 
+import argparse
+import asyncio
+import hashlib
+import io
 import json
-import time
 import os
+import sqlite3
+import struct
+from typing import Iterable, Iterator, Optional
+import ijson
+import numpy as np
 import psycopg2
-from google import genai
+import psycopg2.extras
+from psycopg2.pool import ThreadedConnectionPool
+from pgvector.psycopg2 import register_vector
+from google.genai import errors
+from gemini_client import RateLimiter, call_gemini, create_client
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -75,85 +87,596 @@ _require("DB_PASSWORD")
 
 # ── Setup ─────────────────────────────────────────────────────────────────────
 
-client = genai.Client(api_key=GEMINI_API_KEY)
+client = create_client(GEMINI_API_KEY)
 
-def get_embedding(text: str) -> list[float]:
-    response = client.models.embed_content(
-        model="gemini-embedding-001",
-        contents=text
+EMBED_MODEL = "gemini-embedding-001"
+
+# Texts sent per embed_content request
+EMBED_BATCH_SIZE = 100
+
+# Max number of embed_content requests in flight at once
+EMBED_CONCURRENCY = int(os.environ.get("EMBED_CONCURRENCY", "16"))
+
+# embed_content requests allowed per minute
+EMBED_RPM = int(os.environ.get("EMBED_RPM", "100"))
+
+# Gemini rejects requests over 4 MB; split batches well before that
+EMBED_MAX_PAYLOAD_BYTES = 3_500_000
+
+embed_limiter = RateLimiter(EMBED_RPM)
+
+
+async def _embed_request(texts: list[str]) -> list[list[float]]:
+    """
+    Embed texts in a single request. Batches that would exceed the payload
+    limit (or that Gemini rejects for it anyway) are split in half and
+    each half is sent on its own.
+    """
+    if len(texts) > 1 and sum(len(t.encode("utf-8")) for t in texts) > EMBED_MAX_PAYLOAD_BYTES:
+        mid = len(texts) // 2
+        return await _embed_request(texts[:mid]) + await _embed_request(texts[mid:])
+
+    try:
+        response = await call_gemini(
+            lambda: client.aio.models.embed_content(model=EMBED_MODEL, contents=texts),
+            embed_limiter
+        )
+    except errors.ClientError as e:
+        if len(texts) > 1 and "payload size exceeds" in str(e):
+            mid = len(texts) // 2
+            return await _embed_request(texts[:mid]) + await _embed_request(texts[mid:])
+        raise
+
+    return [e.values for e in response.embeddings]
+
+
+async def get_embeddings_batch(texts: list[str], batch_size: int = EMBED_BATCH_SIZE) -> list[list[float]]:
+    """
+    Embed texts batch_size at a time. Returns vectors aligned with texts.
+    Texts already in the embedding cache are not sent to Gemini.
+    """
+    keys    = [cache_key(t) for t in texts]
+    vectors = embed_cache.get_many(keys)
+    missing = [i for i, v in enumerate(vectors) if v is None]
+
+    for start in range(0, len(missing), batch_size):
+        todo     = missing[start:start + batch_size]
+        embedded = await _embed_request([texts[i] for i in todo])
+        embed_cache.put_many([(keys[i], v) for i, v in zip(todo, embedded)])
+        for i, v in zip(todo, embedded):
+            vectors[i] = v
+
+    return vectors
+
+
+# ── Embedding cache ───────────────────────────────────────────────────────────
+
+# Embeddings survive across runs here, so a re-run after a crash (or with
+# unchanged chunks) does not pay for them again
+STATE_FOLDER     = _output_folder or os.path.dirname(os.path.abspath(CHUNKS_FILE))
+EMBED_CACHE_FILE = os.path.join(STATE_FOLDER, ".embed_cache.sqlite")
+
+
+def cache_key(text: str) -> str:
+    return hashlib.sha256(f"{EMBED_MODEL}\n{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """SQLite table of embeddings keyed by cache_key(), stored as float32 blobs."""
+
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS cache (hash TEXT PRIMARY KEY, vec BLOB)")
+
+    def get_many(self, keys: list[str]) -> list:
+        found = {}
+        for start in range(0, len(keys), 500):
+            part = keys[start:start + 500]
+            rows = self.conn.execute(
+                f"SELECT hash, vec FROM cache WHERE hash IN ({','.join('?' * len(part))})",
+                part
+            )
+            found.update((h, np.frombuffer(vec, dtype=np.float32)) for h, vec in rows)
+        return [found.get(k) for k in keys]
+
+    def put_many(self, items: list[tuple[str, list[float]]]):
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO cache (hash, vec) VALUES (?, ?)",
+            [(h, np.asarray(v, dtype=np.float32).tobytes()) for h, v in items]
+        )
+        self.conn.commit()
+
+
+embed_cache = EmbeddingCache(EMBED_CACHE_FILE)
+
+
+# ── Bulk upsert ───────────────────────────────────────────────────────────────
+
+# Loads larger than this go through COPY into a staging table instead of
+# multi-row INSERTs
+COPY_THRESHOLD = 200
+
+# float16 for a halfvec column, float32 for vector; set by detect_embedding_type()
+EMBEDDING_DTYPE = np.float32
+
+COLUMNS = (
+    "chunk_id, source_file, doc_type, section_title, "
+    "chunk_index, self_contained, missing_context, "
+    "summary, text, embed_input, embedding"
+)
+
+UPSERT_SET = """
+    ON CONFLICT (chunk_id) DO UPDATE SET
+        source_file     = EXCLUDED.source_file,
+        doc_type        = EXCLUDED.doc_type,
+        section_title   = EXCLUDED.section_title,
+        chunk_index     = EXCLUDED.chunk_index,
+        self_contained  = EXCLUDED.self_contained,
+        missing_context = EXCLUDED.missing_context,
+        summary         = EXCLUDED.summary,
+        text            = EXCLUDED.text,
+        embed_input     = EXCLUDED.embed_input,
+        embedding       = EXCLUDED.embedding
+"""
+
+
+def to_row(chunk: dict, embedding) -> tuple:
+    return (
+        chunk["chunk_id"],
+        chunk["source_file"],
+        chunk["doc_type"],
+        chunk["section_title"],
+        chunk["chunk_index"],
+        chunk["self_contained"],
+        chunk.get("missing_context"),
+        chunk["summary"],
+        chunk["text"],
+        chunk["embed_input"],
+        np.asarray(embedding, dtype=EMBEDDING_DTYPE)
     )
-    return response.embeddings[0].values
 
 
-def insert_chunks(chunks: list[dict]):
-    conn = psycopg2.connect(
-        host=os.environ["DB_HOST"],
-        port=int(os.environ["DB_PORT"]),
-        dbname=os.environ["DB_NAME"],
-        user=os.environ["DB_USER"],
-        password=os.environ["DB_PASSWORD"],
-        sslmode=os.environ.get("DB_SSLMODE", "require"),
+# Binary COPY stream framing: signature, flags, header extension length
+# at the start, and a -1 field count as the trailer
+COPY_HEADER  = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+COPY_TRAILER = struct.pack(">h", -1)
+
+
+def _copy_field(value) -> bytes:
+    """Encode one field for COPY ... WITH (FORMAT binary)."""
+    if value is None:
+        return struct.pack(">i", -1)
+    if isinstance(value, bool):
+        data = b"\x01" if value else b"\x00"
+    elif isinstance(value, int):
+        data = struct.pack(">i", value)
+    elif isinstance(value, np.ndarray):
+        # pgvector's vector/halfvec wire format: int16 dim, int16 unused,
+        # then big-endian float4s (vector) or float2s (halfvec)
+        element = ">f2" if value.dtype == np.float16 else ">f4"
+        data = struct.pack(">hh", len(value), 0) + value.astype(element).tobytes()
+    else:
+        data = str(value).encode("utf-8")
+    return struct.pack(">i", len(data)) + data
+
+
+def upsert_rows(cur, rows: list[tuple]):
+    """
+    Upsert rows into document_chunks in as few round-trips as possible.
+    Small loads use multi-row INSERTs; large loads are streamed with binary
+    COPY into a temp table and merged with a single INSERT ... SELECT.
+    """
+    if len(rows) <= COPY_THRESHOLD:
+        psycopg2.extras.execute_values(
+            cur,
+            f"INSERT INTO document_chunks ({COLUMNS}) VALUES %s {UPSERT_SET}",
+            rows,
+            template="(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)",
+            page_size=500
+        )
+        return
+
+    buf = io.BytesIO()
+    buf.write(COPY_HEADER)
+    for row in rows:
+        buf.write(struct.pack(">h", len(row)))
+        for value in row:
+            buf.write(_copy_field(value))
+    buf.write(COPY_TRAILER)
+    buf.seek(0)
+
+    cur.execute("""
+        CREATE TEMP TABLE document_chunks_stage
+        (LIKE document_chunks INCLUDING DEFAULTS) ON COMMIT DROP
+    """)
+    cur.copy_expert(
+        f"COPY document_chunks_stage ({COLUMNS}) FROM STDIN WITH (FORMAT binary)",
+        buf
     )
-    cur = conn.cursor()
+    cur.execute(f"""
+        INSERT INTO document_chunks ({COLUMNS})
+        SELECT {COLUMNS} FROM document_chunks_stage
+        {UPSERT_SET}
+    """)
+
+
+# ── Embed → insert pipeline ──────────────────────────────────────────────────
+
+# Max (chunk, embedding) pairs waiting for the writer
+QUEUE_SIZE = 1000
+
+# The writer flushes once it holds this many rows, or after this many seconds
+FLUSH_ROWS    = 500
+FLUSH_SECONDS = 5.0
 
-    print(f"Connected to Postgres. Inserting {len(chunks)} chunks...\n")
+# Set EMBED_FORCE=1 to rewrite every chunk, even ones already loaded with the
+# same embed_input (e.g. after changing the embedding model or column type)
+EMBED_FORCE = os.environ.get("EMBED_FORCE", "") == "1"
 
-    for i, chunk in enumerate(chunks):
-        print(f"  [{i+1}/{len(chunks)}] Embedding: '{chunk['section_title'][:60]}'...")
+# chunk_ids that could not be embedded or written in the last run
+FAILED_CHUNKS_FILE = os.path.join(STATE_FOLDER, "failed_chunks.json")
 
+
+def flush_rows(conn, rows: list[tuple]):
+    try:
+        with conn.cursor() as cur:
+            upsert_rows(cur, rows)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+async def write_from_queue(conn, queue: asyncio.Queue, failed: list[str]) -> int:
+    """
+    Single DB writer: drain (chunk, embedding) pairs from the queue and
+    upsert them in batches until the None sentinel arrives. Each flush
+    runs in a worker thread so embedding requests keep going meanwhile,
+    and commits on its own: a failed flush rolls back only its batch,
+    whose chunk_ids are added to `failed`, as are chunks that can't be
+    turned into a row. Returns the number of rows written.
+    """
+    loop       = asyncio.get_running_loop()
+    rows       = []
+    written    = 0
+    finished   = False
+    last_flush = loop.time()
+
+    while not finished:
         try:
-            embedding = get_embedding(chunk["embed_input"])
-
-            cur.execute("""
-                INSERT INTO document_chunks (
-                    chunk_id, source_file, doc_type, section_title,
-                    chunk_index, self_contained, missing_context,
-                    summary, text, embed_input, embedding
-                ) VALUES (
-                    %s, %s, %s, %s,
-                    %s, %s, %s,
-                    %s, %s, %s, %s::vector
-                )
-                ON CONFLICT (chunk_id) DO UPDATE SET
-                    source_file     = EXCLUDED.source_file,
-                    doc_type        = EXCLUDED.doc_type,
-                    section_title   = EXCLUDED.section_title,
-                    chunk_index     = EXCLUDED.chunk_index,
-                    self_contained  = EXCLUDED.self_contained,
-                    missing_context = EXCLUDED.missing_context,
-                    summary         = EXCLUDED.summary,
-                    text            = EXCLUDED.text,
-                    embed_input     = EXCLUDED.embed_input,
-                    embedding       = EXCLUDED.embedding
-            """, (
-                chunk["chunk_id"],
-                chunk["source_file"],
-                chunk["doc_type"],
-                chunk["section_title"],
-                chunk["chunk_index"],
-                chunk["self_contained"],
-                chunk.get("missing_context"),
-                chunk["summary"],
-                chunk["text"],
-                chunk["embed_input"],
-                str(embedding)
-            ))
-
-            conn.commit()
-            time.sleep(0.5)  # avoid Gemini rate limits
+            item = await asyncio.wait_for(queue.get(), timeout=FLUSH_SECONDS)
+            if item is None:
+                finished = True
+            else:
+                chunk, embedding = item
+                try:
+                    rows.append(to_row(chunk, embedding))
+                except Exception as e:
+                    print(f"  ⚠️  Skipping malformed chunk {chunk.get('chunk_id')}: {e!r}")
+                    failed.append(chunk.get("chunk_id"))
+        except asyncio.TimeoutError:
+            pass
+
+        due = len(rows) >= FLUSH_ROWS or loop.time() - last_flush >= FLUSH_SECONDS
+        if rows and (finished or due):
+            print(f"  💾 Writing {len(rows)} chunks...")
+            flush = asyncio.ensure_future(asyncio.to_thread(flush_rows, conn, rows))
+            try:
+                try:
+                    await asyncio.shield(flush)
+                except asyncio.CancelledError:
+                    # Cancelling can't stop the worker thread; let it finish
+                    # with `conn` before the caller cleans the connection up
+                    await asyncio.wait({flush})
+                    raise
+                written += len(rows)
+            except Exception as e:
+                print(f"  ⚠️  Write failed, rolled back {len(rows)} chunks: {e}")
+                failed.extend(row[0] for row in rows)
+            rows       = []
+            last_flush = loop.time()
+
+    return written
 
+
+def detect_embedding_type(conn):
+    """
+    Match EMBEDDING_DTYPE to the embedding column: halfvec columns get
+    float16 payloads (half the bytes on the wire and on disk), vector
+    columns float32. Binary COPY must match the column type exactly.
+    """
+    global EMBEDDING_DTYPE
+
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT format_type(atttypid, atttypmod)
+            FROM   pg_attribute
+            WHERE  attrelid = 'document_chunks'::regclass
+              AND  attname  = 'embedding'
+              AND  attnum   > 0
+        """)
+        col_type = cur.fetchone()[0]
+    conn.commit()
+
+    EMBEDDING_DTYPE = np.float16 if col_type.startswith("halfvec") else np.float32
+    print(f"Embedding column: {col_type} → {np.dtype(EMBEDDING_DTYPE).name} payloads")
+
+
+# Connections are rented from one pool for the whole process, so repeated
+# insert_chunks() runs don't each pay for a new SSL handshake
+DB_POOL_MAX = 16
+
+_pool = None
+
+
+def get_pool() -> ThreadedConnectionPool:
+    global _pool
+    if _pool is None:
+        _pool = ThreadedConnectionPool(
+            1, DB_POOL_MAX,
+            host=os.environ["DB_HOST"],
+            port=int(os.environ["DB_PORT"]),
+            dbname=os.environ["DB_NAME"],
+            user=os.environ["DB_USER"],
+            password=os.environ["DB_PASSWORD"],
+            sslmode=os.environ.get("DB_SSLMODE", "require"),
+        )
+    return _pool
+
+
+def rent_connection(autocommit: bool = False):
+    conn = get_pool().getconn()
+    conn.autocommit = autocommit
+    # Lets numpy arrays be passed straight through as vector parameters
+    register_vector(conn)
+    return conn
+
+
+def return_connection(conn):
+    # The pool rolls back any open transaction and discards broken connections
+    get_pool().putconn(conn)
+
+
+def close_pool():
+    if _pool is not None:
+        _pool.closeall()
+
+
+def prepare_lookup(conn):
+    """
+    Prepare the preflight lookup on `conn` once; it runs for every batch,
+    so this saves a parse and plan per batch. Prepared statements live as
+    long as the session, so a pooled connection may already have it.
+    """
+    with conn.cursor() as cur:
+        cur.execute("SELECT 1 FROM pg_prepared_statements WHERE name = 'find_loaded'")
+        if cur.fetchone():
+            return
+        cur.execute("""
+            PREPARE find_loaded (text[]) AS
+            SELECT chunk_id, md5(embed_input)
+            FROM   document_chunks
+            WHERE  chunk_id = ANY($1)
+              AND  embedding IS NOT NULL
+        """)
+
+
+def find_loaded_chunks(conn, chunks: list[dict]) -> set[str]:
+    """
+    Return the chunk_ids already in document_chunks with an embedding and
+    an identical embed_input, i.e. rows a re-run would rewrite unchanged.
+    Only md5 digests travel back, not the stored text. `conn` must have
+    been through prepare_lookup().
+    """
+    digests = {
+        c["chunk_id"]: hashlib.md5(c["embed_input"].encode("utf-8")).hexdigest()
+        for c in chunks
+    }
+    with conn.cursor() as cur:
+        cur.execute("EXECUTE find_loaded (%s)", (list(digests),))
+        return {chunk_id for chunk_id, digest in cur.fetchall() if digests[chunk_id] == digest}
+
+
+def iter_chunks(path: str) -> Iterator[dict]:
+    """Stream chunks out of the top-level JSON array without loading it all."""
+    with open(path, "rb") as f:
+        yield from ijson.items(f, "item")
+
+
+def iter_batches(chunks: Iterable[dict], size: int) -> Iterator[list[dict]]:
+    batch = []
+    for chunk in chunks:
+        batch.append(chunk)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# Vector index that bulk loads drop and rebuild (see migrate.ts)
+EMBEDDING_INDEX = "document_chunks_embedding_idx"
+
+# Definition of the dropped index, kept on disk until the rebuild succeeds so
+# a run killed mid-load can still put the index back on the next start
+DROPPED_INDEX_FILE = os.path.join(STATE_FOLDER, ".dropped_embedding_index.sql")
+
+
+def drop_embedding_index(conn) -> Optional[str]:
+    """
+    Drop the vector index so a bulk load does not pay index maintenance on
+    every row. Returns its definition for restore_embedding_index(), or
+    None if the index does not exist. An index still left dropped by an
+    interrupted bulk load is not rebuilt first; its saved definition is
+    returned instead.
+    """
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_get_indexdef(to_regclass(%s))", (EMBEDDING_INDEX,))
+        indexdef = cur.fetchone()[0]
+        if indexdef:
+            with open(DROPPED_INDEX_FILE, "w", encoding="utf-8") as f:
+                f.write(indexdef)
+            cur.execute(f"DROP INDEX {EMBEDDING_INDEX}")
+            print(f"Dropped {EMBEDDING_INDEX} for the bulk load.\n")
+        elif os.path.exists(DROPPED_INDEX_FILE):
+            print(f"{EMBEDDING_INDEX} is still dropped from an interrupted bulk load; it will be rebuilt after this one.\n")
+            with open(DROPPED_INDEX_FILE, encoding="utf-8") as f:
+                indexdef = f.read()
+    conn.commit()
+    return indexdef
+
+
+def restore_embedding_index(conn, indexdef: str):
+    """Rebuild the index dropped by drop_embedding_index() in one pass."""
+    with conn.cursor() as cur:
+        # A run killed after the rebuild but before cleanup leaves it in place
+        cur.execute("SELECT to_regclass(%s)", (EMBEDDING_INDEX,))
+        if cur.fetchone()[0] is None:
+            cur.execute(indexdef)
+    conn.commit()
+    if os.path.exists(DROPPED_INDEX_FILE):
+        os.remove(DROPPED_INDEX_FILE)
+
+
+def restore_interrupted_index(conn):
+    """Rebuild an index left dropped by an earlier run that never finished."""
+    if not os.path.exists(DROPPED_INDEX_FILE):
+        return
+    print(f"Rebuilding {EMBEDDING_INDEX} left dropped by an interrupted bulk load...\n")
+    with open(DROPPED_INDEX_FILE, encoding="utf-8") as f:
+        restore_embedding_index(conn, f.read())
+
+
+async def insert_chunks(chunks: Iterable[dict], bulk: bool = False):
+    """
+    Embed and upsert `chunks`. With bulk=True the vector index is dropped
+    for the duration of the load and rebuilt once at the end, which is much
+    faster for large (re)loads; leave it off for small incremental runs so
+    search keeps its index.
+    """
+    # The writer owns `conn` (one transaction per flush, in a worker thread);
+    # preflight lookups use their own autocommit connection so they never
+    # land inside a half-written flush.
+    conn        = rent_connection()
+    lookup_conn = rent_connection(autocommit=True)
+    prepare_lookup(lookup_conn)
+
+    print("Connected to Postgres. Embedding chunks...\n")
+    detect_embedding_type(conn)
+
+    # A bulk load rebuilds the index at the end anyway, so only incremental
+    # runs put back an index left dropped by an interrupted one
+    indexdef = None
+    if bulk:
+        indexdef = drop_embedding_index(conn)
+    else:
+        restore_interrupted_index(conn)
+
+    # Embedders put (chunk, embedding) pairs on the queue; a single writer
+    # drains it into Postgres, so the DB is busy while Gemini is working.
+    queue     = asyncio.Queue(maxsize=QUEUE_SIZE)
+    semaphore = asyncio.Semaphore(EMBED_CONCURRENCY)
+    counts    = {"read": 0, "skipped": 0}
+    failed    = []
+
+    async def embed_batch(first: int, batch: list[dict]):
+        # The slot is held until the batch is fully on the queue, so a slow
+        # writer also stops produce() from reading further ahead
+        try:
+            print(f"  [{first}-{first+len(batch)-1}] Embedding batch...")
+            embeddings = await get_embeddings_batch([c["embed_input"] for c in batch])
         except Exception as e:
-            print(f"  ⚠️  Error on chunk {i+1}: {e}")
+            print(f"  ⚠️  Error on chunks {first}-{first+len(batch)-1}: {e}")
+            failed.extend(c["chunk_id"] for c in batch)
+            semaphore.release()
+            return
+
+        try:
+            for chunk, embedding in zip(batch, embeddings):
+                await queue.put((chunk, embedding))
+        finally:
+            semaphore.release()
+
+    async def produce():
+        # Reading stops while EMBED_CONCURRENCY batches are being embedded or
+        # waiting for queue space, so only a bounded slice of the input (plus
+        # the queue itself) is ever held in memory.
+        tasks = []
+        try:
+            for batch in iter_batches(chunks, EMBED_BATCH_SIZE):
+                first = counts["read"] + 1
+                counts["read"] += len(batch)
+
+                # Drop chunks already in the table before paying for embeddings
+                if not EMBED_FORCE:
+                    loaded = await asyncio.to_thread(find_loaded_chunks, lookup_conn, batch)
+                    counts["skipped"] += len(loaded)
+                    batch = [c for c in batch if c["chunk_id"] not in loaded]
+                    if not batch:
+                        continue
+
+                await semaphore.acquire()
+                tasks.append(asyncio.create_task(embed_batch(first, batch)))
+
+            await asyncio.gather(*tasks)
+        finally:
+            # On failure or cancellation, don't leave batches running
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        await queue.put(None)
+
+    producer = asyncio.create_task(produce())
+    writer   = asyncio.create_task(write_from_queue(conn, queue, failed))
+    try:
+        # Stop as soon as either side fails: a dead writer would otherwise
+        # leave the embedders blocked on a full queue forever
+        done, _ = await asyncio.wait({producer, writer}, return_when=asyncio.FIRST_EXCEPTION)
+        for task in done:
+            task.result()
+        inserted = writer.result()
+    finally:
+        # Stop whichever side is still running (and any flush the writer has
+        # in flight) before `conn` is rolled back, reindexed or handed back
+        # to the pool
+        for task in (producer, writer):
+            task.cancel()
+        await asyncio.gather(producer, writer, return_exceptions=True)
+        if indexdef:
+            print(f"\nRebuilding {EMBEDDING_INDEX}...")
             conn.rollback()
-            continue
+            restore_embedding_index(conn, indexdef)
+        return_connection(conn)
+        return_connection(lookup_conn)
+
+    if counts["skipped"]:
+        print(f"\nSkipped {counts['skipped']} chunks already loaded with the same content.")
+    if failed:
+        # Everything else is committed. A re-run skips the loaded chunks
+        # (and reuses cached embeddings), so it only redoes these.
+        with open(FAILED_CHUNKS_FILE, "w", encoding="utf-8") as f:
+            json.dump(failed, f, indent=2)
+        raise SystemExit(
+            f"\n⚠️  {inserted} of {counts['read']} chunks inserted, {len(failed)} failed "
+            f"(listed in {FAILED_CHUNKS_FILE}). Re-run to retry them."
+        )
+
+    if os.path.exists(FAILED_CHUNKS_FILE):
+        os.remove(FAILED_CHUNKS_FILE)
 
-    cur.close()
-    conn.close()
-    print(f"\n✅ Done! {len(chunks)} chunks inserted.")
+    print(f"\n✅ Done! {inserted} of {counts['read']} chunks inserted.")
 
 
 if __name__ == "__main__":
-    with open(CHUNKS_FILE, "r", encoding="utf-8") as f:
-        chunks = json.load(f)
+    parser = argparse.ArgumentParser(description="Embed all_chunks.json and load it into Postgres.")
+    parser.add_argument(
+        "--bulk",
+        action="store_true",
+        help=f"drop {EMBEDDING_INDEX} during the load and rebuild it afterwards"
+    )
+    args = parser.parse_args()
 
-    insert_chunks(chunks)
+    try:
+        asyncio.run(insert_chunks(iter_chunks(CHUNKS_FILE), bulk=args.bulk))
+    finally:
+        close_pool()
@@ -0,0 +1,135 @@
+"""
+Shared Gemini client setup for the pipeline scripts.
+
+chunker.py and embed_and_insert.py fire many concurrent requests through
+client.aio. Giving the SDK one pooled HTTP/2 httpx client means those
+requests reuse a handful of open connections instead of paying a new
+TLS handshake each time, and routing every call through call_gemini()
+keeps them under the quota and retries the ones Gemini pushes back on.
+
+Install dependencies:
+  pip install google-genai "httpx[http2]"
+"""
+
+import asyncio
+import random
+import re
+import time
+import httpx
+from google import genai
+from google.genai import errors, types
+
+# Connections kept open to the Gemini endpoint (per process)
+MAX_CONNECTIONS = 64
+
+# Attempts per call for rate-limit (429) and transient server (5xx) errors
+MAX_ATTEMPTS = 8
+
+
+def create_client(api_key: str) -> genai.Client:
+    """
+    Build the genai.Client for this process. Each call to create_client
+    opens a new connection pool, so call it once per process (at module
+    level) and share the result.
+    """
+    async_http = httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(
+            max_connections=MAX_CONNECTIONS,
+            max_keepalive_connections=MAX_CONNECTIONS
+        ),
+        # The SDK passes its own per-request timeout; don't cut long
+        # generate_content calls short with httpx's 5 s default
+        timeout=None
+    )
+    return genai.Client(
+        api_key=api_key,
+        http_options=types.HttpOptions(httpx_async_client=async_http)
+    )
+
+
+# ── Rate limiting and retries ─────────────────────────────────────────────────
+
+class RateLimiter:
+    """
+    Async token bucket: allows `rate` acquisitions per `period` seconds,
+    refilling continuously. pause() blocks every caller for a while, e.g.
+    when Gemini says to back off, instead of each task retrying on its own.
+
+    Set `rate` to match your Gemini quota tier, and share one instance
+    across every task that makes the same kind of call.
+    """
+
+    def __init__(self, rate: int, period: float = 60.0):
+        self.capacity     = rate
+        self.tokens       = float(rate)
+        self.fill_rate    = rate / period
+        self.updated      = time.monotonic()
+        self.paused_until = 0.0
+        self._lock        = None
+
+    async def acquire(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+
+                self.tokens  = min(self.capacity, self.tokens + (now - self.updated) * self.fill_rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self.tokens) / self.fill_rate)
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        # Start refilling from empty once the pause is over
+        self.tokens  = 0.0
+        self.updated = self.paused_until
+
+
+def retry_delay(error: errors.APIError, attempt: int) -> float:
+    """
+    Seconds to wait before retrying a failed call. Uses the server-suggested
+    RetryInfo delay when present, otherwise exponential back-off with
+    jitter (1, 2, 4, ... capped at 60 s).
+    """
+    details = (error.details or {}).get("error", {}).get("details", [])
+    for detail in details:
+        if detail.get("@type", "").endswith("RetryInfo"):
+            match = re.match(r"([\d.]+)s", detail.get("retryDelay", ""))
+            if match:
+                return float(match.group(1))
+    return min(2 ** attempt + random.uniform(0, 1), 60)
+
+
+async def call_gemini(request, limiter: RateLimiter, max_attempts: int = MAX_ATTEMPTS):
+    """
+    Await request() (a zero-argument function returning a fresh coroutine)
+    once the limiter allows it. 429 RESOURCE_EXHAUSTED pauses the whole
+    limiter before retrying; 5xx errors back off this call only. Anything
+    else, or the last failed attempt, is raised.
+    """
+    for attempt in range(max_attempts):
+        await limiter.acquire()
+        try:
+            return await request()
+
+        except errors.APIError as e:
+            rate_limited = e.code == 429
+            if not (rate_limited or isinstance(e, errors.ServerError)) or attempt == max_attempts - 1:
+                raise
+
+            delay = retry_delay(e, attempt)
+            if rate_limited:
+                print(f"  ⏳ Rate limited by Gemini, pausing requests for {delay:.0f}s...")
+                limiter.pause(delay)
+            else:
+                print(f"  ⏳ Gemini error {e.code}, retrying in {delay:.0f}s...")
+                await asyncio.sleep(delay)
@@ -1,9 +1,9 @@
 import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 from dotenv import load_dotenv
 import pymupdf4llm
 import docx
-from markdownify import markdownify as md
 
 load_dotenv()
 
@@ -27,11 +27,24 @@ def convert_pdf(filepath: Path) -> str:
     """Convert PDF to Markdown using pymupdf4llm (preserves structure well)."""
     return pymupdf4llm.to_markdown(str(filepath))
 
+def _docx_paragraph_to_markdown(para) -> str:
+    """Render one paragraph, turning Word heading styles into # markers."""
+    style = para.style.name if para.style is not None else ""
+    if style == "Title":
+        return f"# {para.text}"
+    if style.startswith("Heading "):
+        level = style.rsplit(" ", 1)[-1]
+        if level.isdigit():
+            return f"{'#' * min(int(level), 6)} {para.text}"
+    return para.text
+
+
 def convert_docx(filepath: Path) -> str:
     """Convert Word doc to Markdown."""
     doc = docx.Document(str(filepath))
-    full_text = "\n\n".join([para.text for para in doc.paragraphs if para.text.strip()])
-    return md(full_text)
+    return "\n\n".join(
+        _docx_paragraph_to_markdown(para) for para in doc.paragraphs if para.text.strip()
+    )
 
 if __name__ == "__main__":
     input_path = Path(INPUT_FOLDER)
@@ -44,26 +57,29 @@ if __name__ == "__main__":
         print(f"    Looking in: {INPUT_FOLDER}")
         exit()
 
-    for pdf in pdf_files:
-        print(f"📄 Converting PDF: {pdf.name}")
-        try:
-            markdown = convert_pdf(pdf)
-            out_path = Path(OUTPUT_FOLDER) / f"{pdf.stem}.md"
-            with open(out_path, "w", encoding="utf-8") as f:
-                f.write(markdown)
-            print(f"  ✅ Saved as {out_path.name}")
-        except Exception as e:
-            print(f"  ⚠️  Failed: {e}")
-
-    for docx_file in docx_files:
-        print(f"📄 Converting DOCX: {docx_file.name}")
-        try:
-            markdown = convert_docx(docx_file)
-            out_path = Path(OUTPUT_FOLDER) / f"{docx_file.stem}.md"
-            with open(out_path, "w", encoding="utf-8") as f:
-                f.write(markdown)
-            print(f"  ✅ Saved as {out_path.name}")
-        except Exception as e:
-            print(f"  ⚠️  Failed: {e}")
+    jobs = (
+        [("PDF", convert_pdf, pdf) for pdf in pdf_files] +
+        [("DOCX", convert_docx, docx_file) for docx_file in docx_files]
+    )
+
+    # Conversions are CPU-bound and independent, so run them in worker
+    # processes; only this process writes the output files.
+    with ProcessPoolExecutor(max_workers=min(len(jobs), os.cpu_count() or 1)) as executor:
+        futures = {
+            executor.submit(convert, filepath): (kind, filepath)
+            for kind, convert, filepath in jobs
+        }
+
+        for future in as_completed(futures):
+            kind, filepath = futures[future]
+            print(f"📄 {kind}: {filepath.name}")
+            try:
+                markdown = future.result()
+                out_path = Path(OUTPUT_FOLDER) / f"{filepath.stem}.md"
+                with open(out_path, "w", encoding="utf-8") as f:
+                    f.write(markdown)
+                print(f"  ✅ Saved as {out_path.name}")
+            except Exception as e:
+                print(f"  ⚠️  Failed: {e}")
 
     print("\n✅ All conversions done! You can now run chunker.py")
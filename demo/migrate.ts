@@ -31,7 +31,10 @@ async function migrate() {
     console.log("Table didn't exist - that's OK");
   }
 
-  console.log("Creating document_chunks table with vector(3072)...");
+  // halfvec stores each dimension as float16: half the disk, WAL and
+  // page-cache footprint of vector(3072), with negligible recall loss.
+  // Requires pgvector >= 0.7 (the halfvec type does not exist before that)
+  console.log("Creating document_chunks table with halfvec(3072)...");
   await db.execute(sql`
     CREATE TABLE IF NOT EXISTS document_chunks (
       chunk_id        TEXT PRIMARY KEY,
@@ -44,33 +47,23 @@ async function migrate() {
       summary         TEXT,
       text            TEXT NOT NULL,
       embed_input     TEXT,
-      embedding       vector(3072),
+      embedding       halfvec(3072),
       created_at      TIMESTAMPTZ DEFAULT now()
     )
   `);
 
   console.log("Creating vector search index...");
-  // Neon pgvector has a 2000 dimension limit for indexes (both HNSW and ivfflat)
-  // Since gemini-embedding-001 outputs 3072 dimensions, we skip index creation
-  // Vector search will still work, just slower without the index
-  try {
-    await db.execute(sql`
-      CREATE INDEX IF NOT EXISTS document_chunks_embedding_idx
-      ON document_chunks
-      USING ivfflat (embedding vector_cosine_ops)
-      WITH (lists = 100)
-    `);
-    console.log("✅ Vector index created successfully");
-  } catch (err: any) {
-    const errorStr = String(err) + (err.cause ? String(err.cause) : "");
-    if (errorStr.includes("cannot have more than 2000 dimensions")) {
-      console.warn("⚠️  Vector dimension (3072) exceeds Neon's 2000-dimension index limit");
-      console.warn("⚠️  Vector search will work without index (slower performance)");
-      console.warn("⚠️  To use indexes, reduce dimension to <2000 or use a smaller embedding model");
-    } else {
-      throw err;
-    }
-  }
+  // pgvector indexes vector columns up to 2000 dimensions but halfvec columns
+  // up to 4000, so gemini-embedding-001's 3072 dimensions can be indexed.
+  // HNSW rather than ivfflat: ivfflat picks its centroids from the rows present
+  // at build time, and this table is still empty, which would leave it with
+  // random centroids and low recall. HNSW builds fine on an empty table
+  await db.execute(sql`
+    CREATE INDEX IF NOT EXISTS document_chunks_embedding_idx
+    ON document_chunks
+    USING hnsw (embedding halfvec_cosine_ops)
+  `);
+  console.log("✅ Vector index created successfully");
 
   console.log("✅ Migration complete!");
   await pool.end();
@@ -28,8 +28,9 @@ const geminiClient = new GoogleGenAI({ apiKey: GEMINI_CONFIG.apiKey! });
 const gemini = geminiClient;
 
 // ── Dimension Management ──────────────────────────────────────────────────────
-let EFFECTIVE_DIM      = 0;      // Actual embedding dimension in the database
-let TRUNCATE_EMBEDDING = false;  // Whether to truncate embeddings before search
+let EFFECTIVE_DIM      = 0;         // Actual embedding dimension in the database
+let EMBEDDING_TYPE     = "vector";  // Column type: "vector" (float32) or "halfvec" (float16)
+let TRUNCATE_EMBEDDING = false;     // Whether to truncate embeddings before search
 
 /**
  * Detects and validates the embedding dimension alignment between the database
@@ -51,16 +52,17 @@ export async function detectDimensions(): Promise<void> {
   `);
 
   const colType  = (colResult.rows[0] as any)?.col_type as string ?? "";
-  const dimMatch = /vector\((\d+)\)/.exec(colType);
+  const dimMatch = /^(halfvec|vector)\((\d+)\)$/.exec(colType);
 
   if (!dimMatch) {
     throw new Error(
       `[startup] Cannot parse embedding column type from DB (got: "${colType}"). ` +
-      `Ensure the document_chunks table exists with an 'embedding vector(N)' column.`
+      `Ensure the document_chunks table exists with an 'embedding halfvec(N)' or 'embedding vector(N)' column.`
     );
   }
 
-  EFFECTIVE_DIM = parseInt(dimMatch[1], 10);
+  EMBEDDING_TYPE = dimMatch[1];
+  EFFECTIVE_DIM  = parseInt(dimMatch[2], 10);
 
   // Probe the Gemini model to get its actual output dimension
   const probeResp = await gemini.models.embedContent({
@@ -85,8 +87,8 @@ export async function detectDimensions(): Promise<void> {
     // In production, a mismatch is fatal — data consistency is critical
     throw new Error(
       `[startup] FATAL: embedding dimension mismatch in production. ` +
-      `DB column is vector(${EFFECTIVE_DIM}) but ${GEMINI_CONFIG.embeddingModel} produces ${modelDim} dims. ` +
-      `Fix options: (1) ALTER TABLE document_chunks ALTER COLUMN embedding TYPE vector(${modelDim}) ` +
+      `DB column is ${EMBEDDING_TYPE}(${EFFECTIVE_DIM}) but ${GEMINI_CONFIG.embeddingModel} produces ${modelDim} dims. ` +
+      `Fix options: (1) ALTER TABLE document_chunks ALTER COLUMN embedding TYPE ${EMBEDDING_TYPE}(${modelDim}) ` +
       `and re-ingest all documents, or (2) switch to a model that outputs ${EFFECTIVE_DIM} dims.`
     );
   }
@@ -104,7 +106,7 @@ export async function detectDimensions(): Promise<void> {
     throw new Error(
       `[startup] Embedding dimension mismatch: DB column expects ${EFFECTIVE_DIM} dims ` +
       `but model produces only ${modelDim} dims. Padding is not safe. ` +
-      `Fix: ALTER the column to vector(${modelDim}) and re-ingest, or use a model that outputs ${EFFECTIVE_DIM} dims.`
+      `Fix: ALTER the column to ${EMBEDDING_TYPE}(${modelDim}) and re-ingest, or use a model that outputs ${EFFECTIVE_DIM} dims.`
     );
   }
 }
@@ -157,7 +159,10 @@ export async function retrieveChunks(embedding: number[], topK: number = RAG_CON
     `vectorStr_preview=[${embedding.slice(0, 3).join(",")}...]`
   );
 
-  // Use PostgreSQL cosine distance operator (<=>)to find similar chunks
+  // Use PostgreSQL cosine distance operator (<=>)to find similar chunks.
+  // The query vector is cast to the column's own type so halfvec columns
+  // compare halfvec to halfvec (and can use their index)
+  const embeddingType = sql.raw(EMBEDDING_TYPE);
   const result = await withTimeout(
     db.execute(sql`
       SELECT
@@ -165,9 +170,9 @@ export async function retrieveChunks(embedding: number[], topK: number = RAG_CON
         source_file,
         section_title,
         text,
-        1 - (embedding <=> ${vectorStr}::vector) AS similarity
+        1 - (embedding <=> ${vectorStr}::${embeddingType}) AS similarity
       FROM document_chunks
-      ORDER BY embedding <=> ${vectorStr}::vector
+      ORDER BY embedding <=> ${vectorStr}::${embeddingType}
       LIMIT ${topK}
     `),
     PG_VECTOR_SEARCH_TIMEOUT_MS,